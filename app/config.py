@@ -13,6 +13,11 @@ class Settings:
         print(f"  POSTGRES_SERVER: {os.getenv('POSTGRES_SERVER')}")
         print(f"  POSTGRES_PORT: {os.getenv('POSTGRES_PORT')}")
 
+        # Unset variables would silently end up as "None" inside DATABASE_URL
+        missing = [name for name in ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB") if getattr(self, name) is None]
+        if missing:
+            raise RuntimeError(f"Missing database settings: {', '.join(missing)}")
+
     PROJECT_NAME: str = "Data Logger API"
     POSTGRES_USER: str = os.getenv("POSTGRES_USER")
     POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD")
@@ -25,4 +30,14 @@ class Settings:
         f"{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
 
+    # Log every SQL statement (very verbose, slows report generation)
+    SQL_ECHO: bool = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+    # "python" runs the extrapolation in calculation_service, "sql" pushes it into PostgreSQL
+    UPTIME_AGGREGATION: str = os.getenv("UPTIME_AGGREGATION", "python")
+
+    # Threads splitting one report's stores by store_id range (python aggregation only).
+    # Each thread holds its own pooled connection for the whole report
+    REPORT_THREADS: int = int(os.getenv("REPORT_THREADS", 1))
+
 settings = Settings()
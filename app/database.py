@@ -1,13 +1,47 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from .config import settings
 
+# Connections per process: sized for concurrent API requests plus background report jobs
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+
 # Create SQLAlchemy engine
-engine = create_engine(settings.DATABASE_URL, echo=True)
+engine = create_engine(
+    settings.DATABASE_URL,
+    echo=settings.SQL_ECHO,
+    poolclass=QueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=True,  # Drop dead connections instead of failing the request
+    pool_recycle=1800,
+    pool_use_lifo=True,  # Reuse warm connections, let idle ones time out
+    # Keeps API requests from hanging on runaway queries; background work lifts it
+    connect_args={"options": "-c statement_timeout=60000"},
+)
 
 # Create a session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class BackgroundSession(Session):
+    """Session for report generation and ingestion, whose statements may run for minutes"""
+
+
+def disable_statement_timeout(connection) -> None:
+    """Lift the API statement timeout for the connection's current transaction"""
+    connection.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+@event.listens_for(BackgroundSession, "after_begin")
+def _background_session_begin(session, transaction, connection):
+    disable_statement_timeout(connection)
+
+
+# Session factory for background work (report workers, ingestion)
+BackgroundSessionLocal = sessionmaker(class_=BackgroundSession, autocommit=False, autoflush=False, bind=engine)
+
 # Base class for models
 Base = declarative_base()
 
@@ -3,17 +3,21 @@ Store Monitoring API
 Clean and simple API endpoints
 """
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+from threading import Lock
+import gzip
+from cachetools import TTLCache, cached
+from sqlalchemy import text
 
 from .database import engine, SessionLocal
-from .models import Base, StoreTimezone, StoreHours, StoreStatus
-from .services.background_service import create_report_job, start_report_generation, get_report_status
-from .services.search_service import search_report, get_store_details, get_report_summary
+from .models import Base, StoreTimezone, StoreHours, StoreStatus, upgrade_schema
+from .services.background_service import create_report_job, start_report_generation, start_ingestion, get_report_status, warm_report_workers, shutdown_report_workers
+from .services.store_service import get_latest_status_timestamp
+from .services.search_service import list_restaurants as list_report_restaurants, get_store_details, get_report_summary
 
 # Initialize FastAPI app
 app = FastAPI(title="Store Monitoring API")
@@ -30,10 +34,22 @@ app.add_middleware(
 # Mount static files (frontend)
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
+# Dashboard polling endpoints (/stats, /reports) may serve data a few seconds stale
+_endpoint_cache = TTLCache(maxsize=8, ttl=5)
+_endpoint_cache_lock = Lock()
+
 @app.on_event("startup")
 def on_startup() -> None:
-    """Create database tables on startup"""
+    """Create database tables and start a report worker on startup"""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    warm_report_workers()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    """Stop background report workers"""
+    shutdown_report_workers()
 
 
 # ===== CORE API ENDPOINTS (Required by specs) =====
@@ -48,6 +64,10 @@ def trigger_report():
         # Create report job
         report_id = create_report_job()
         
+        # Make the new report show up in /reports right away
+        with _endpoint_cache_lock:
+            _endpoint_cache.pop("reports", None)
+        
         # Start generation in background
         start_report_generation(report_id)
         
@@ -58,7 +78,7 @@ def trigger_report():
 
 
 @app.get("/get_report")
-def get_report(report_id: str):
+def get_report(report_id: str, accept_encoding: str = Header("")):
     """
     Get report status or CSV data
     Returns "Running" if not complete, or CSV file if complete
@@ -72,11 +92,7 @@ def get_report(report_id: str):
         if result["status"] == "Running":
             return {"status": "Running"}
         elif result["status"] == "Complete":
-            return PlainTextResponse(
-                content=result["csv_data"],
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename=report_{report_id}.csv"}
-            )
+            return _csv_response(result, f"report_{report_id}.csv", accept_encoding)
             
     except HTTPException:
         raise
@@ -94,30 +110,15 @@ def list_restaurants(report_id: str):
     Simple list for frontend - click on any restaurant to get details
     """
     try:
-        result = search_report(report_id) 
+        result = list_report_restaurants(report_id)
         
         if result.get("status_code") != 200:
             raise HTTPException(status_code=result["status_code"], detail=result.get("error", "Failed to get restaurants"))
         
-     
-        restaurants = []
-        for store in result["results"]["stores"]:
-            restaurants.append({
-                "store_id": store["store_id"],
-                "uptime_last_hour": store["uptime_percentage"]["last_hour"],
-                "uptime_last_day": store["uptime_percentage"]["last_day"], 
-                "uptime_last_week": store["uptime_percentage"]["last_week"],
-                "average_uptime": round((
-                    store["uptime_percentage"]["last_hour"] +
-                    store["uptime_percentage"]["last_day"] +
-                    store["uptime_percentage"]["last_week"]
-                ) / 3, 1)
-            })
-        
         return {
-            "report_id": report_id,
-            "total_restaurants": len(restaurants),
-            "restaurants": restaurants
+            "report_id": result["report_id"],
+            "total_restaurants": result["total_restaurants"],
+            "restaurants": result["restaurants"]
         }
         
     except HTTPException:
@@ -155,11 +156,26 @@ def list_all_reports():
     Perfect for frontend to show available reports
     """
     try:
-        db = SessionLocal()
-        
+        return _load_reports()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting reports: {str(e)}")
+
+
+@cached(_endpoint_cache, key=lambda: "reports", lock=_endpoint_cache_lock)
+def _load_reports() -> dict:
+    """Load all reports (cached for a few seconds)"""
+    db = SessionLocal()
+    try:
         # Get all reports ordered by creation date (newest first)
         from .models import ReportJob
-        reports = db.query(ReportJob).order_by(ReportJob.created_at.desc()).all()
+        # Only the listed columns, never the CSV/JSON payloads
+        reports = db.query(
+            ReportJob.report_id,
+            ReportJob.status,
+            ReportJob.created_at,
+            ReportJob.completed_at,
+            ReportJob.json_data.isnot(None).label("has_data")
+        ).order_by(ReportJob.created_at.desc()).all()
         
         report_list = []
         for report in reports:
@@ -168,24 +184,19 @@ def list_all_reports():
                 "status": report.status,
                 "created_at": report.created_at.isoformat(),
                 "completed_at": report.completed_at.isoformat() if report.completed_at else None,
-                "has_data": report.status == "Complete" and report.json_data is not None
+                "has_data": report.status == "Complete" and report.has_data
             })
         
-        db.close()
-        
         return {
             "total_reports": len(report_list),
             "reports": report_list
         }
-        
-    except Exception as e:
-        if 'db' in locals():
-            db.close()
-        raise HTTPException(status_code=500, detail=f"Error getting reports: {str(e)}")
+    finally:
+        db.close()
 
 
 @app.get("/download_csv/{report_id}")
-def download_csv(report_id: str):
+def download_csv(report_id: str, accept_encoding: str = Header("")):
     """
     Direct CSV download endpoint
     Returns CSV file with proper filename
@@ -199,13 +210,7 @@ def download_csv(report_id: str):
         if result["status"] != "Complete":
             raise HTTPException(status_code=400, detail=f"Report is {result['status'].lower()}, cannot download")
         
-        return PlainTextResponse(
-            content=result["csv_data"],
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename=store_monitoring_report_{report_id[:8]}.csv"
-            }
-        )
+        return _csv_response(result, f"store_monitoring_report_{report_id[:8]}.csv", accept_encoding)
             
     except HTTPException:
         raise
@@ -213,6 +218,52 @@ def download_csv(report_id: str):
         raise HTTPException(status_code=500, detail=f"Error downloading CSV: {str(e)}")
 
 
+def _csv_response(result: dict, filename: str, accept_encoding: str) -> Response:
+    """
+    Build the CSV download response
+    The stored gzip bytes are sent as-is when the client accepts gzip
+    """
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    
+    csv_data_gz = result.get("csv_data_gz")
+    if csv_data_gz is None:
+        return PlainTextResponse(content=result["csv_data"], media_type="text/csv", headers=headers)
+    
+    headers["Vary"] = "Accept-Encoding"
+    if _accepts_gzip(accept_encoding):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=csv_data_gz, media_type="text/csv", headers=headers)
+    
+    return PlainTextResponse(
+        content=gzip.decompress(csv_data_gz).decode("utf-8"),
+        media_type="text/csv",
+        headers=headers
+    )
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip
+    gzip;q=0 refuses it; a wildcard covers gzip when gzip is not listed itself
+    """
+    wildcard_q = None
+    for token in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in token.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return q > 0
+        if coding == "*":
+            wildcard_q = q
+    return wildcard_q is not None and wildcard_q > 0
+
+
 # ===== HELPER ENDPOINTS =====
 
 @app.get("/")
@@ -224,45 +275,51 @@ def read_root():
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now(pytz.UTC).isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
 @app.get("/stats")
 def get_stats():
     """Get basic statistics about the data"""
     try:
-        db = SessionLocal()
-        
+        return _load_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
+
+
+@cached(_endpoint_cache, key=lambda: "stats", lock=_endpoint_cache_lock)
+def _load_stats() -> dict:
+    """
+    Load table statistics (cached for a few seconds)
+    store_status is large, so its count is the planner's estimate when available
+    """
+    db = SessionLocal()
+    try:
         # Count records in each table
         timezone_count = db.query(StoreTimezone).count()
         hours_count = db.query(StoreHours).count()
-        status_count = db.query(StoreStatus).count()
+        status_count = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'store_status'")
+        ).scalar()
+        if not status_count or status_count < 0:
+            # Table never analyzed yet, fall back to an exact count
+            status_count = db.query(StoreStatus).count()
         
         # Get latest timestamp
-        latest_status = db.query(StoreStatus).order_by(StoreStatus.timestamp_utc.desc()).first()
-        latest_timestamp = latest_status.timestamp_utc if latest_status else None
+        latest_timestamp = get_latest_status_timestamp(db)
         
-        db.close()
-    
         return {
             "store_timezones": timezone_count,
             "store_hours": hours_count,
             "store_status": status_count,
             "latest_status_timestamp": latest_timestamp.isoformat() if latest_timestamp else None
         }
-        
-    except Exception as e:
-        if 'db' in locals():
-            db.close()
-        raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
+    finally:
+        db.close()
 
 
 @app.post("/ingest")
-def trigger_ingestion(background_tasks: BackgroundTasks):
+def trigger_ingestion():
     """Trigger data ingestion from CSV files"""
-    def _run_ingestion_job() -> None:
-        from scripts.ingest_data import ingest_data
-        ingest_data()
-    
-    background_tasks.add_task(_run_ingestion_job)
+    start_ingestion()
     return {"message": "Ingestion started"}
\ No newline at end of file
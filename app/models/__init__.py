@@ -1,9 +1,10 @@
-from sqlalchemy import Column, String, Integer, Time, DateTime, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, Time, DateTime, Text, LargeBinary, Index, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
+from datetime import time
 import uuid
 
-from ..database import Base, engine, SessionLocal
+from ..database import Base, engine, SessionLocal, BackgroundSessionLocal, disable_statement_timeout
 
 
 class StoreTimezone(Base):
@@ -15,23 +16,40 @@ class StoreTimezone(Base):
 
 class StoreHours(Base):
     __tablename__ = "store_hours"
+    __table_args__ = (
+        Index("ix_store_hours_store_dow", "store_id", "dayOfWeek"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    store_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True, nullable=False)
+    store_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
     dayOfWeek: Mapped[int] = mapped_column(Integer, nullable=False)
-    start_time_local: Mapped[str] = mapped_column(String, nullable=False)
-    end_time_local: Mapped[str] = mapped_column(String, nullable=False)
+    start_time_local: Mapped[time] = mapped_column(Time, nullable=False)
+    end_time_local: Mapped[time] = mapped_column(Time, nullable=False)
 
 
 class StoreStatus(Base):
     __tablename__ = "store_status"
+    __table_args__ = (
+        # Per-store time range scans
+        Index("ix_store_status_store_ts", "store_id", "timestamp_utc"),
+        # Cheap global time range filters on an append-mostly table
+        Index("ix_store_status_ts_brin", "timestamp_utc", postgresql_using="brin"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    store_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True, nullable=False)
+    store_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
     status: Mapped[str] = mapped_column(String, nullable=False)
     timestamp_utc: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
 
 
+class IngestState(Base):
+    __tablename__ = "ingest_state"
+
+    # Single row (id = 1) maintained by ingestion
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    max_timestamp_utc: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class ReportJob(Base):
     __tablename__ = "report_jobs"
 
@@ -39,7 +57,59 @@ class ReportJob(Base):
     status: Mapped[str] = mapped_column(String, nullable=False)  # "Running", "Complete", "Failed"
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
     completed_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=True)
-    csv_data: Mapped[str] = mapped_column(Text, nullable=True)
-    json_data: Mapped[str] = mapped_column(Text, nullable=True)  # Store JSON for search functionality
+    # Large payloads are deferred: loaded only when the attribute is accessed
+    csv_data: Mapped[str] = mapped_column(Text, nullable=True, deferred=True)  # Reports created before csv_data_gz
+    csv_data_gz: Mapped[bytes] = mapped_column(LargeBinary, nullable=True, deferred=True)  # gzip-compressed CSV
+    json_data: Mapped[dict] = mapped_column(JSONB, nullable=True, deferred=True)  # Store JSON for search functionality
     error_message: Mapped[str] = mapped_column(String, nullable=True)
 
+
+# Idempotent changes for databases created by an older version
+# (create_all only creates missing tables, it never alters existing ones)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS csv_data_gz BYTEA",
+    # Composite indexes replace the single-column store_id indexes
+    "CREATE INDEX IF NOT EXISTS ix_store_status_store_ts ON store_status (store_id, timestamp_utc)",
+    "CREATE INDEX IF NOT EXISTS ix_store_status_ts_brin ON store_status USING brin (timestamp_utc)",
+    "DROP INDEX IF EXISTS ix_store_status_store_id",
+    'CREATE INDEX IF NOT EXISTS ix_store_hours_store_dow ON store_hours (store_id, "dayOfWeek")',
+    "DROP INDEX IF EXISTS ix_store_hours_store_id",
+    # Data ingested before ingest_state existed
+    """
+    INSERT INTO ingest_state (id, max_timestamp_utc)
+    SELECT 1, (SELECT MAX(timestamp_utc) FROM store_status)
+    WHERE NOT EXISTS (SELECT 1 FROM ingest_state)
+    ON CONFLICT (id) DO NOTHING
+    """,
+    # Business hours were stored as 'HH:MM:SS' strings
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'store_hours' AND column_name = 'start_time_local') <> 'time without time zone' THEN
+            ALTER TABLE store_hours
+                ALTER COLUMN start_time_local TYPE time USING CAST(start_time_local AS time),
+                ALTER COLUMN end_time_local TYPE time USING CAST(end_time_local AS time);
+        END IF;
+    END $$
+    """,
+    # Report JSON was stored as text and parsed by PostgreSQL on every restaurant list
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'report_jobs' AND column_name = 'json_data') = 'text' THEN
+            ALTER TABLE report_jobs ALTER COLUMN json_data TYPE jsonb USING CAST(json_data AS jsonb);
+        END IF;
+    END $$
+    """,
+]
+
+
+def upgrade_schema(bind) -> None:
+    """Apply SCHEMA_UPGRADES to an existing database"""
+    with bind.begin() as connection:
+        # Index builds and column conversions on large tables outlast the API timeout
+        disable_statement_timeout(connection)
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
@@ -1,16 +1,31 @@
 """
 Background job service
-Handles async report generation
+Handles async report generation and data ingestion
 """
 
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+import gzip
+import logging
+import multiprocessing
+import os
 import uuid
-from threading import Thread
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from threading import Lock
+from typing import Optional
 
-from ..database import SessionLocal
+from sqlalchemy import Text, cast, literal
+from sqlalchemy.dialects.postgresql import JSONB
+
+from ..database import BackgroundSessionLocal, SessionLocal
 from ..models import ReportJob
-from .report_service import generate_report_data, update_report_job
+
+
+# Report generation and ingestion are CPU-bound, so they run in worker processes
+# (not threads) to use every core and keep the API process responsive
+_report_executor: Optional[ProcessPoolExecutor] = None
+_report_executor_lock = Lock()
 
 
 def create_report_job() -> str:
@@ -26,7 +41,7 @@ def create_report_job() -> str:
         report_job = ReportJob(
             report_id=report_id,
             status="Running",
-            created_at=datetime.now(pytz.UTC)
+            created_at=datetime.now(timezone.utc)
         )
         db.add(report_job)
         db.commit()
@@ -37,30 +52,153 @@ def create_report_job() -> str:
         db.close()
 
 
+def _get_report_executor() -> ProcessPoolExecutor:
+    """
+    Get the report worker pool, creating it on first use
+    """
+    global _report_executor
+    with _report_executor_lock:
+        if _report_executor is None:
+            _report_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                # Fresh interpreters: no DB connections or threads inherited from the API process
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _report_executor
+
+
+def _init_worker():
+    """
+    Load the compiled uptime kernels when a worker process starts
+    """
+    from .calculation_service import warm_up
+    warm_up()
+
+
+def _worker_ready():
+    """
+    No-op task, used to start a worker
+    """
+
+
+def warm_report_workers():
+    """
+    Start a worker at application startup so the first report doesn't pay for the JIT
+    """
+    _submit(_worker_ready)
+
+
+def _submit(fn, *args) -> Future:
+    """
+    Run fn(*args) in the worker pool
+    """
+    global _report_executor
+    try:
+        return _get_report_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died earlier and took the pool down with it, start a new pool
+        with _report_executor_lock:
+            _report_executor = None
+        return _get_report_executor().submit(fn, *args)
+
+
 def start_report_generation(report_id: str):
     """
-    Start report generation in background thread
+    Start report generation in a worker process
+    """
+    _submit(_generate_report_async, report_id).add_done_callback(partial(_on_report_done, report_id))
+
+
+def _on_report_done(report_id: str, future: Future):
+    """
+    Record a failure if the worker crashed
+    (errors inside the report code are recorded by _generate_report_async)
+    """
+    if future.cancelled():
+        update_report_job(report_id, "Failed", error_message="Report generation was cancelled")
+    elif future.exception() is not None:
+        logging.error(f"Report worker for {report_id} failed: {future.exception()}")
+        update_report_job(report_id, "Failed", error_message=str(future.exception()))
+
+
+def start_ingestion():
+    """
+    Start CSV ingestion in a worker process
+    """
+    _submit(_run_ingestion).add_done_callback(_on_ingestion_done)
+
+
+def _on_ingestion_done(future: Future):
+    """
+    Log a crashed ingestion worker (ingest_data logs its own errors)
     """
-    thread = Thread(target=_generate_report_async, args=(report_id,))
-    thread.start()
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"Ingestion worker failed: {future.exception()}")
+
+
+def _run_ingestion():
+    """
+    Run the ingestion script
+    """
+    from scripts.ingest_data import ingest_data
+    ingest_data()
+
+
+def shutdown_report_workers():
+    """
+    Stop the report worker pool, cancelling reports that have not started
+    """
+    with _report_executor_lock:
+        executor = _report_executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def _generate_report_async(report_id: str):
     """
     Generate the report asynchronously
     """
+    # Imported here so the API process never loads the numeric stack (numpy, numba)
+    from .report_service import generate_report_data
+    
     try:
         # Generate both CSV and JSON data
         csv_data, json_data = generate_report_data()
         
+        # Store the CSV compressed, it is served as-is to clients accepting gzip
+        csv_data_gz = gzip.compress(csv_data.encode("utf-8"), compresslevel=6)
+        
         # Update job as complete
-        update_report_job(report_id, "Complete", csv_data=csv_data, json_data=json_data)
+        update_report_job(report_id, "Complete", csv_data_gz=csv_data_gz, json_data=json_data)
         
     except Exception as e:
         # Mark report as failed
         update_report_job(report_id, "Failed", error_message=str(e))
 
 
+def update_report_job(report_id: str, status: str, csv_data_gz: bytes = None, json_data: str = None, error_message: str = None):
+    """
+    Update report job status in database
+    """
+    db = BackgroundSessionLocal()
+    try:
+        report_job = db.query(ReportJob).filter(ReportJob.report_id == report_id).first()
+        if report_job:
+            report_job.status = status
+            report_job.completed_at = datetime.now(timezone.utc)
+            if csv_data_gz:
+                report_job.csv_data_gz = csv_data_gz
+            if json_data:
+                # Already serialized: cast the text server-side instead of encoding it again
+                report_job.json_data = cast(literal(json_data, Text), JSONB)
+            if error_message:
+                report_job.error_message = error_message
+            db.commit()
+    finally:
+        db.close()
+
+
 def get_report_status(report_id: str) -> dict:
     """
     Get report job status and data
@@ -76,11 +214,15 @@ def get_report_status(report_id: str) -> dict:
         if report_job.status == "Running":
             return {"status": "Running", "status_code": 200}
         elif report_job.status == "Complete":
-            return {
+            result = {
                 "status": "Complete", 
-                "csv_data": report_job.csv_data,
+                "csv_data_gz": report_job.csv_data_gz,
                 "status_code": 200
             }
+            if result["csv_data_gz"] is None:
+                # Report generated before CSVs were stored compressed
+                result["csv_data"] = report_job.csv_data
+            return result
         else:  # Failed
             return {
                 "error": f"Report generation failed: {report_job.error_message}",
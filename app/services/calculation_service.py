@@ -3,16 +3,17 @@ Uptime calculation service
 Contains the core extrapolation algorithm
 """
 
-from datetime import datetime
-import pytz
-from typing import List, Tuple, Any
+import numpy as np
+from numba import njit
+from typing import Tuple
 
 
+@njit(cache=True, fastmath=True, nogil=True)
 def extrapolate_uptime(
-    observations: List[Any], 
-    start_time: datetime, 
-    end_time: datetime, 
-    store_tz: pytz.BaseTzInfo
+    timestamps: np.ndarray,
+    is_active: np.ndarray,
+    start_time: float,
+    end_time: float
 ) -> Tuple[float, float]:
     """
     Extrapolate uptime/downtime from sparse observations
@@ -23,49 +24,82 @@ def extrapolate_uptime(
     - Between observations: assume previous status continues
     - After last observation: assume same status as last observation
     
+    timestamps are sorted UTC epoch seconds inside [start_time, end_time],
+    is_active holds the matching statuses.
+    
     Returns: (uptime_minutes, downtime_minutes)
     """
-    if not observations:
+    if timestamps.size == 0:
         # No data, assume store was operating normally during business hours
-        total_minutes = (end_time - start_time).total_seconds() / 60
-        return total_minutes, 0
+        total_minutes = (end_time - start_time) / 60
+        return total_minutes, 0.0
     
-    # Sort observations by timestamp
-    sorted_obs = sorted(observations, key=lambda x: x.timestamp_utc)
+    uptime_minutes = 0.0
+    downtime_minutes = 0.0
     
-    uptime_minutes = 0
-    downtime_minutes = 0
+    # Before first observation: assume same status as first observation
     current_time = start_time
+    current_active = is_active[0]
     
-    for i, obs in enumerate(sorted_obs):
-        obs_time = obs.timestamp_utc.replace(tzinfo=pytz.UTC).astimezone(store_tz)
-        
-        if i == 0:
-            # Before first observation: assume same status as first observation
-            if obs_time > current_time:
-                duration_minutes = (obs_time - current_time).total_seconds() / 60
-                if obs.status == "active":
-                    uptime_minutes += duration_minutes
-                else:
-                    downtime_minutes += duration_minutes
-        else:
-            # Between observations: use previous observation's status
-            prev_obs = sorted_obs[i-1]
-            duration_minutes = (obs_time - current_time).total_seconds() / 60
-            if prev_obs.status == "active":
-                uptime_minutes += duration_minutes
-            else:
-                downtime_minutes += duration_minutes
-        
-        current_time = obs_time
-    
-    # After last observation until end_time
-    if current_time < end_time:
-        last_obs = sorted_obs[-1]
-        duration_minutes = (end_time - current_time).total_seconds() / 60
-        if last_obs.status == "active":
+    for i in range(timestamps.size):
+        # Each segment takes the status of the observation that opens it
+        duration_minutes = (timestamps[i] - current_time) / 60
+        if current_active:
             uptime_minutes += duration_minutes
         else:
             downtime_minutes += duration_minutes
+        current_time = timestamps[i]
+        current_active = is_active[i]
+    
+    # After last observation until end_time
+    duration_minutes = (end_time - current_time) / 60
+    if current_active:
+        uptime_minutes += duration_minutes
+    else:
+        downtime_minutes += duration_minutes
     
     return uptime_minutes, downtime_minutes
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def extrapolate_periods(
+    timestamps: np.ndarray,
+    is_active: np.ndarray,
+    periods: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Sum extrapolate_uptime over business periods
+    
+    periods is an (n, 2) array of (period_start, period_end) UTC epoch seconds;
+    each period only sees the observations that fall inside it.
+    
+    Returns: (uptime_minutes, downtime_minutes)
+    """
+    total_uptime_minutes = 0.0
+    total_downtime_minutes = 0.0
+    
+    for p in range(periods.shape[0]):
+        period_start = periods[p, 0]
+        period_end = periods[p, 1]
+        
+        # Observations are sorted, so the period's slice is found by bisection
+        lo = np.searchsorted(timestamps, period_start, side="left")
+        hi = np.searchsorted(timestamps, period_end, side="right")
+        
+        uptime_mins, downtime_mins = extrapolate_uptime(
+            timestamps[lo:hi], is_active[lo:hi], period_start, period_end
+        )
+        total_uptime_minutes += uptime_mins
+        total_downtime_minutes += downtime_mins
+    
+    return total_uptime_minutes, total_downtime_minutes
+
+
+def warm_up() -> None:
+    """
+    Compile (or load from the on-disk cache) the kernels ahead of the first report
+    """
+    timestamps = np.array([60.0, 120.0])
+    is_active = np.array([True, False])
+    periods = np.array([[0.0, 180.0]])
+    extrapolate_periods(timestamps, is_active, periods)
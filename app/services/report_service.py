@@ -3,15 +3,42 @@ Report generation service
 Handles all report calculation logic
 """
 
-from datetime import datetime, timedelta, time
-import pytz
-import pandas as pd
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import orjson
+import csv
 import io
-from sqlalchemy import func
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import Float, String, cast, extract, select
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from uuid import UUID
 
-from ..database import SessionLocal
-from ..models import StoreStatus, StoreHours, StoreTimezone, ReportJob
+from ..config import settings
+from ..database import MAX_OVERFLOW, POOL_SIZE, BackgroundSessionLocal
+from ..models import StoreStatus
+from .store_service import (
+    get_latest_status_timestamp,
+    iter_store_timezones,
+    get_all_store_business_hours,
+    get_store_timezone,
+    get_store_business_hours,
+)
+from .search_service import classify_performance
+from .sql_uptime_service import calculate_all_store_uptime_sql
+from .time_service import get_business_periods_in_range, clip_business_periods
+
+
+CSV_HEADER = (
+    "store_id",
+    "uptime_last_hour(in minutes)",
+    "uptime_last_day(in hours)",
+    "uptime_last_week(in hours)",
+    "downtime_last_hour(in minutes)",
+    "downtime_last_day(in hours)",
+    "downtime_last_week(in hours)"
+)
 
 
 def generate_report_data() -> tuple[str, str]:
@@ -19,89 +46,71 @@ def generate_report_data() -> tuple[str, str]:
     Generate the complete report data in both CSV and JSON formats
     Returns (csv_string, json_string)
     """
-    db = SessionLocal()
+    db = BackgroundSessionLocal()
     try:
         # Get max timestamp to use as "current time"
-        max_timestamp = db.query(func.max(StoreStatus.timestamp_utc)).scalar()
+        max_timestamp = get_latest_status_timestamp(db)
         if not max_timestamp:
             raise Exception("No status data found")
         
-        current_time = max_timestamp.replace(tzinfo=pytz.UTC)
+        # timestamptz comes back in the session's time zone: convert, don't relabel
+        current_time = max_timestamp.astimezone(timezone.utc)
         
         # Calculate time ranges
         last_hour_start = current_time - timedelta(hours=1)
         last_day_start = current_time - timedelta(days=1)
         last_week_start = current_time - timedelta(weeks=1)
         
-        # Get all stores
-        all_stores = db.query(StoreTimezone.store_id).distinct().all()
+        if settings.UPTIME_AGGREGATION == "sql":
+            store_uptimes = calculate_all_store_uptime_sql(
+                db, last_hour_start, last_day_start, last_week_start, current_time
+            )
+        else:
+            store_uptimes = calculate_all_store_uptime(
+                db, last_hour_start, last_day_start, last_week_start, current_time
+            )
         
-        report_data = []
+        # Both outputs are written store by store as the uptimes are computed,
+        # so the report never exists as a list of dicts next to its serialized forms
+        json_buffer = io.BytesIO()
+        json_buffer.write(b'{"stores":[')
+        csv_buffer = io.StringIO()
+        writer = csv.writer(csv_buffer, lineterminator="\n")
+        writer.writerow(CSV_HEADER)
+        total_stores = 0
         
-        for store_row in all_stores:
-            store_id = str(store_row.store_id)
-            
-            # Calculate uptime/downtime for each period
-            hour_data = calculate_store_uptime(db, store_id, last_hour_start, current_time)
-            day_data = calculate_store_uptime(db, store_id, last_day_start, current_time)
-            week_data = calculate_store_uptime(db, store_id, last_week_start, current_time)
+        for store_id, hour_data, day_data, week_data in store_uptimes:
+            store_report = _build_store_report(store_id, hour_data, day_data, week_data)
             
-            # Store data for JSON (more detailed)
-            store_report = {
-                "store_id": store_id,
-                "uptime_last_hour_minutes": round(hour_data["uptime_minutes"], 2),
-                "uptime_last_day_hours": round(day_data["uptime_minutes"] / 60, 2),
-                "uptime_last_week_hours": round(week_data["uptime_minutes"] / 60, 2),
-                "downtime_last_hour_minutes": round(hour_data["downtime_minutes"], 2),
-                "downtime_last_day_hours": round(day_data["downtime_minutes"] / 60, 2),
-                "downtime_last_week_hours": round(week_data["downtime_minutes"] / 60, 2),
-                # Add calculated percentages for frontend
-                "uptime_percentage": {
-                    "last_hour": round((hour_data["uptime_minutes"] / max(1, hour_data["uptime_minutes"] + hour_data["downtime_minutes"])) * 100, 1),
-                    "last_day": round((day_data["uptime_minutes"] / max(60, day_data["uptime_minutes"] + day_data["downtime_minutes"])) * 100, 1),
-                    "last_week": round((week_data["uptime_minutes"] / max(60, week_data["uptime_minutes"] + week_data["downtime_minutes"])) * 100, 1)
-                },
-                "total_business_time": {
-                    "last_hour_minutes": round(hour_data["uptime_minutes"] + hour_data["downtime_minutes"], 2),
-                    "last_day_hours": round((day_data["uptime_minutes"] + day_data["downtime_minutes"]) / 60, 2),
-                    "last_week_hours": round((week_data["uptime_minutes"] + week_data["downtime_minutes"]) / 60, 2)
-                }
-            }
-            
-            report_data.append(store_report)
+            if total_stores:
+                json_buffer.write(b",")
+            json_buffer.write(orjson.dumps(store_report))
+            writer.writerow((
+                store_report["store_id"],
+                store_report["uptime_last_hour_minutes"],
+                store_report["uptime_last_day_hours"],
+                store_report["uptime_last_week_hours"],
+                store_report["downtime_last_hour_minutes"],
+                store_report["downtime_last_day_hours"],
+                store_report["downtime_last_week_hours"]
+            ))
+            total_stores += 1
         
-        # Generate JSON
-        import json
-        json_data = {
-            "report_metadata": {
-                "generated_at": current_time.isoformat(),
-                "total_stores": len(report_data),
-                "time_periods": {
-                    "last_hour": (last_hour_start.isoformat(), current_time.isoformat()),
-                    "last_day": (last_day_start.isoformat(), current_time.isoformat()),
-                    "last_week": (last_week_start.isoformat(), current_time.isoformat())
-                }
-            },
-            "stores": report_data
+        # The metadata goes after the stores: total_stores is only known now
+        report_metadata = {
+            "generated_at": current_time.isoformat(),
+            "total_stores": total_stores,
+            "time_periods": {
+                "last_hour": (last_hour_start.isoformat(), current_time.isoformat()),
+                "last_day": (last_day_start.isoformat(), current_time.isoformat()),
+                "last_week": (last_week_start.isoformat(), current_time.isoformat())
+            }
         }
-        json_string = json.dumps(json_data, indent=2)
+        json_buffer.write(b'],"report_metadata":')
+        json_buffer.write(orjson.dumps(report_metadata))
+        json_buffer.write(b"}")
         
-        # Generate CSV (convert JSON data to CSV format)
-        csv_data = []
-        for store in report_data:
-            csv_data.append({
-                "store_id": store["store_id"],
-                "uptime_last_hour(in minutes)": store["uptime_last_hour_minutes"],
-                "uptime_last_day(in hours)": store["uptime_last_day_hours"],
-                "uptime_last_week(in hours)": store["uptime_last_week_hours"],
-                "downtime_last_hour(in minutes)": store["downtime_last_hour_minutes"],
-                "downtime_last_day(in hours)": store["downtime_last_day_hours"],
-                "downtime_last_week(in hours)": store["downtime_last_week_hours"]
-            })
-        
-        df = pd.DataFrame(csv_data)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
+        json_string = json_buffer.getvalue().decode()
         csv_string = csv_buffer.getvalue()
         
         return csv_string, json_string
@@ -110,72 +119,180 @@ def generate_report_data() -> tuple[str, str]:
         db.close()
 
 
-def calculate_store_uptime(db, store_id: str, start_time: datetime, end_time: datetime) -> Dict[str, float]:
+def _build_store_report(
+    store_id: str,
+    hour_data: Dict[str, float],
+    day_data: Dict[str, float],
+    week_data: Dict[str, float]
+) -> Dict[str, Any]:
+    """
+    Build a store's entry of the JSON report (the CSV row is taken from it)
+    """
+    # Calculated percentages for frontend
+    uptime_percentage = {
+        "last_hour": round((hour_data["uptime_minutes"] / max(1, hour_data["uptime_minutes"] + hour_data["downtime_minutes"])) * 100, 1),
+        "last_day": round((day_data["uptime_minutes"] / max(60, day_data["uptime_minutes"] + day_data["downtime_minutes"])) * 100, 1),
+        "last_week": round((week_data["uptime_minutes"] / max(60, week_data["uptime_minutes"] + week_data["downtime_minutes"])) * 100, 1)
+    }
+    avg_uptime = (uptime_percentage["last_hour"] + uptime_percentage["last_day"] + uptime_percentage["last_week"]) / 3
+    
+    return {
+        "store_id": store_id,
+        "uptime_last_hour_minutes": round(hour_data["uptime_minutes"], 2),
+        "uptime_last_day_hours": round(day_data["uptime_minutes"] / 60, 2),
+        "uptime_last_week_hours": round(week_data["uptime_minutes"] / 60, 2),
+        "downtime_last_hour_minutes": round(hour_data["downtime_minutes"], 2),
+        "downtime_last_day_hours": round(day_data["downtime_minutes"] / 60, 2),
+        "downtime_last_week_hours": round(week_data["downtime_minutes"] / 60, 2),
+        "uptime_percentage": uptime_percentage,
+        # Precomputed so search endpoints don't recompute them per request
+        "avg_uptime_percentage": round(avg_uptime, 1),
+        "performance_status": classify_performance(avg_uptime),
+        "total_business_time": {
+            "last_hour_minutes": round(hour_data["uptime_minutes"] + hour_data["downtime_minutes"], 2),
+            "last_day_hours": round((day_data["uptime_minutes"] + day_data["downtime_minutes"]) / 60, 2),
+            "last_week_hours": round((week_data["uptime_minutes"] + week_data["downtime_minutes"]) / 60, 2)
+        }
+    }
+
+
+def calculate_all_store_uptime(
+    db,
+    last_hour_start: datetime,
+    last_day_start: datetime,
+    last_week_start: datetime,
+    current_time: datetime
+) -> Iterator[Tuple[str, Dict[str, float], Dict[str, float], Dict[str, float]]]:
     """
-    Calculate uptime and downtime for a store in a given time period
-    Only considers business hours and extrapolates from observations
+    Calculate uptime/downtime for every store in Python
+    Yields (store_id, hour_data, day_data, week_data) in store_id order
     """
-    from .store_service import get_store_timezone, get_store_business_hours
-    from .time_service import get_business_periods_in_range
-    from .calculation_service import extrapolate_uptime
+    # Business hours are small and loaded up front
+    business_hours_by_store = get_all_store_business_hours(db)
+    windows = (last_hour_start, last_day_start, last_week_start, current_time)
     
-    # Get store data
-    store_tz = get_store_timezone(db, store_id)
-    business_hours = get_store_business_hours(db, store_id)
+    # Each range thread holds a connection until its range is done, and the caller's
+    # session already holds one: never ask the pool for more than it can hand out
+    threads = min(settings.REPORT_THREADS, POOL_SIZE + MAX_OVERFLOW - 1)
+    if threads <= 1:
+        yield from _calculate_store_range(db, business_hours_by_store, windows, None, None)
+        return
     
-    # Get status observations for this period
-    status_records = db.query(StoreStatus).filter(
-        StoreStatus.store_id == store_id,
-        StoreStatus.timestamp_utc >= start_time,
-        StoreStatus.timestamp_utc <= end_time
-    ).order_by(StoreStatus.timestamp_utc).all()
+    # Split the UUID space into equal store_id ranges, each streamed and computed
+    # on its own connection; DB fetches and the nogil kernels run concurrently
+    bounds = [UUID(int=i * (1 << 128) // threads) for i in range(1, threads)]
+    ranges = list(zip([None] + bounds, bounds + [None]))
     
-    # Get business periods within the time range
-    business_periods = get_business_periods_in_range(
-        business_hours, start_time, end_time, store_tz
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(_calculate_store_range_in_session, business_hours_by_store, windows, start_id, end_id)
+            for start_id, end_id in ranges
+        ]
+        for future in futures:
+            yield from future.result()
+
+
+def _calculate_store_range_in_session(
+    business_hours_by_store: Dict[str, List[Any]],
+    windows: Tuple[datetime, datetime, datetime, datetime],
+    start_id: Optional[UUID],
+    end_id: Optional[UUID]
+) -> List[Tuple[str, Dict[str, float], Dict[str, float], Dict[str, float]]]:
+    """
+    Calculate one store_id range with a session of its own (sessions are not thread-safe)
+    """
+    db = BackgroundSessionLocal()
+    try:
+        return list(_calculate_store_range(db, business_hours_by_store, windows, start_id, end_id))
+    finally:
+        db.close()
+
+
+def _calculate_store_range(
+    db,
+    business_hours_by_store: Dict[str, List[Any]],
+    windows: Tuple[datetime, datetime, datetime, datetime],
+    start_id: Optional[UUID],
+    end_id: Optional[UUID]
+) -> Iterator[Tuple[str, Dict[str, float], Dict[str, float], Dict[str, float]]]:
+    """
+    Calculate uptime/downtime for the stores in [start_id, end_id) (None = unbounded)
+    that have observations in the week
+    Status rows and timezones are streamed in store_id order and merged so memory stays flat
+    """
+    last_hour_start, last_day_start, last_week_start, current_time = windows
+    
+    # Plain Core rows with the store_id as text and the epoch/active flag computed
+    # by PostgreSQL: no UUID or datetime objects are built per observation
+    status_query = select(
+        cast(StoreStatus.store_id, String),
+        cast(extract("epoch", StoreStatus.timestamp_utc), Float),
+        StoreStatus.status == "active"
+    ).where(
+        StoreStatus.timestamp_utc >= last_week_start,
+        StoreStatus.timestamp_utc <= current_time
     )
+    if start_id is not None:
+        status_query = status_query.where(StoreStatus.store_id >= start_id)
+    if end_id is not None:
+        status_query = status_query.where(StoreStatus.store_id < end_id)
     
-    total_uptime_minutes = 0
-    total_downtime_minutes = 0
+    status_rows = db.connection().execute(
+        status_query.order_by(StoreStatus.store_id, StoreStatus.timestamp_utc)
+        .execution_options(yield_per=10_000)
+    )
+    timezone_rows = iter_store_timezones(db, start_id, end_id)
+    timezone_row = next(timezone_rows, None)
     
-    # Calculate for each business period
-    for period_start, period_end in business_periods:
-        # Get relevant observations for this business period
-        period_observations = [
-            obs for obs in status_records
-            if period_start <= obs.timestamp_utc.replace(tzinfo=pytz.UTC).astimezone(store_tz) <= period_end
-        ]
+    # Stores are the ones with observations in the week; timezones are merged in
+    # (stores without a timezone row get the default)
+    for store_id, store_rows in groupby(status_rows, key=itemgetter(0)):
+        while timezone_row is not None and timezone_row[0] < store_id:
+            timezone_row = next(timezone_rows, None)
+        timezone_str = timezone_row[1] if timezone_row is not None and timezone_row[0] == store_id else None
         
-        # Calculate uptime/downtime using extrapolation
-        uptime_mins, downtime_mins = extrapolate_uptime(
-            period_observations, period_start, period_end, store_tz
-        )
+        # Transpose the store's rows into columns in one step
+        _, timestamps, is_active = zip(*store_rows)
         
-        total_uptime_minutes += uptime_mins
-        total_downtime_minutes += downtime_mins
+        store_tz = get_store_timezone(timezone_str)
+        business_hours = get_store_business_hours(business_hours_by_store, store_id)
+        timestamps = np.array(timestamps, dtype=np.float64)
+        is_active = np.array(is_active, dtype=np.bool_)
+        
+        # All windows end at current_time: build the week's business periods once
+        # and clip them for the shorter windows
+        week_periods = get_business_periods_in_range(business_hours, last_week_start, current_time, store_tz)
+        
+        # Calculate uptime/downtime for each period
+        hour_data = calculate_store_uptime(timestamps, is_active, clip_business_periods(week_periods, last_hour_start))
+        day_data = calculate_store_uptime(timestamps, is_active, clip_business_periods(week_periods, last_day_start))
+        week_data = calculate_store_uptime(timestamps, is_active, week_periods)
+        
+        yield store_id, hour_data, day_data, week_data
+
+
+def calculate_store_uptime(
+    timestamps: np.ndarray,
+    is_active: np.ndarray,
+    business_periods: List[Tuple[float, float]]
+) -> Dict[str, float]:
+    """
+    Calculate uptime and downtime for a store over its business periods
+    Extrapolates from observations
+
+    timestamps/is_active are the store's preloaded observations (sorted UTC
+    epoch seconds); only those inside a business period are used.
+    """
+    from .calculation_service import extrapolate_periods
+    
+    periods = np.array(business_periods, dtype=np.float64).reshape(-1, 2)
+    
+    # Extrapolate every business period in one compiled call
+    total_uptime_minutes, total_downtime_minutes = extrapolate_periods(
+        timestamps, is_active, periods
+    )
     
     return {
         "uptime_minutes": total_uptime_minutes,
         "downtime_minutes": total_downtime_minutes
     }
-
-
-def update_report_job(report_id: str, status: str, csv_data: str = None, json_data: str = None, error_message: str = None):
-    """
-    Update report job status in database
-    """
-    db = SessionLocal()
-    try:
-        report_job = db.query(ReportJob).filter(ReportJob.report_id == report_id).first()
-        if report_job:
-            report_job.status = status
-            report_job.completed_at = datetime.now(pytz.UTC)
-            if csv_data:
-                report_job.csv_data = csv_data
-            if json_data:
-                report_job.json_data = json_data
-            if error_message:
-                report_job.error_message = error_message
-            db.commit()
-    finally:
-        db.close()
@@ -3,13 +3,89 @@ Search service for restaurant data
 Handles searching through generated reports
 """
 
-import json
-from typing import Dict, List, Optional, Any
+import orjson
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from sqlalchemy import Text, cast, select, text
+from typing import Dict, List, Optional, Any, Tuple
 
 from ..database import SessionLocal
 from ..models import ReportJob
 
 
+# Average uptime thresholds of the performance buckets, in ascending order
+PERFORMANCE_THRESHOLDS = (70, 80, 90, 95)
+PERFORMANCE_STATUSES = ("Critical", "Poor", "Fair", "Good", "Excellent")
+
+# Per-store fields for the restaurant list, extracted by PostgreSQL so the
+# full report JSON never reaches Python
+RESTAURANTS_SQL = text("""
+SELECT store ->> 'store_id' AS store_id,
+       CAST(store -> 'uptime_percentage' ->> 'last_hour' AS double precision) AS last_hour,
+       CAST(store -> 'uptime_percentage' ->> 'last_day' AS double precision) AS last_day,
+       CAST(store -> 'uptime_percentage' ->> 'last_week' AS double precision) AS last_week,
+       CAST(store ->> 'avg_uptime_percentage' AS double precision) AS avg_uptime
+FROM report_jobs
+CROSS JOIN jsonb_array_elements(json_data -> 'stores') WITH ORDINALITY AS stores (store, position)
+WHERE report_id = :report_id
+ORDER BY position
+""")
+
+
+@lru_cache(maxsize=32)
+def _load_report(report_id: str, completed_at_iso: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Parse a report's JSON once per process and index its stores by store_id
+    completed_at is part of the key, so a rewritten report is parsed again.
+    Callers must not modify the returned dicts
+    """
+    db = SessionLocal()
+    try:
+        # Fetched as text and parsed with orjson rather than by the driver's json module
+        json_data = db.execute(
+            select(cast(ReportJob.json_data, Text)).where(ReportJob.report_id == report_id)
+        ).scalar()
+    finally:
+        db.close()
+    
+    report_data = orjson.loads(json_data)
+    stores_by_id = {store["store_id"]: store for store in report_data.get("stores", [])}
+    return report_data, stores_by_id
+
+
+def _get_report_data(report_id: str) -> Dict[str, Any]:
+    """
+    Get the parsed JSON of a complete report
+    Returns {"report_data": ..., "stores_by_id": ..., "status_code": 200} or an error dict
+    """
+    db = SessionLocal()
+    try:
+        report_job = db.query(
+            ReportJob.status,
+            ReportJob.completed_at,
+            ReportJob.json_data.isnot(None).label("has_json")
+        ).filter(ReportJob.report_id == report_id).first()
+    finally:
+        db.close()
+    
+    if not report_job:
+        return {"error": "Report not found", "status_code": 404}
+    
+    if report_job.status != "Complete":
+        return {"error": f"Report is {report_job.status.lower()}", "status_code": 400}
+    
+    if not report_job.has_json:
+        return {"error": "No JSON data available for this report", "status_code": 400}
+    
+    try:
+        report_data, stores_by_id = _load_report(report_id, report_job.completed_at.isoformat())
+    except orjson.JSONDecodeError:
+        return {"error": "Invalid JSON data in report", "status_code": 500}
+    
+    return {"report_data": report_data, "stores_by_id": stores_by_id, "status_code": 200}
+
+
 def search_report(report_id: str, store_id: Optional[str] = None, min_uptime: Optional[float] = None) -> Dict[str, Any]:
     """
     Search for restaurant data in a specific report
@@ -22,10 +98,60 @@ def search_report(report_id: str, store_id: Optional[str] = None, min_uptime: Op
     Returns:
         Dictionary with search results
     """
+    loaded = _get_report_data(report_id)
+    if loaded["status_code"] != 200:
+        return loaded
+    report_data = loaded["report_data"]
+    
+    # Filter by store_id if provided (direct lookup)
+    if store_id:
+        store = loaded["stores_by_id"].get(store_id)
+        candidate_stores = [store] if store else []
+    else:
+        candidate_stores = report_data.get("stores", [])
+    filtered_stores = []
+    
+    for store in candidate_stores:
+        # Filter by minimum uptime if provided (exact average, like classify_performance)
+        if min_uptime is not None and _average_of_percentages(store) < min_uptime:
+            continue
+        
+        filtered_stores.append(store)
+    
+    # Prepare response
+    result = {
+        "report_id": report_id,
+        "report_metadata": report_data.get("report_metadata", {}),
+        "filters_applied": {
+            "store_id": store_id,
+            "min_uptime": min_uptime
+        },
+        "results": {
+            "total_stores_found": len(filtered_stores),
+            "stores": filtered_stores
+        },
+        "status_code": 200
+    }
+    
+    return result
+
+
+def list_restaurants(report_id: str) -> Dict[str, Any]:
+    """
+    Get the compact restaurant list of a report
+    
+    Args:
+        report_id: The report to list
+    
+    Returns:
+        Dictionary with one entry per store (uptime percentages only)
+    """
     db = SessionLocal()
     try:
-        # Get the report
-        report_job = db.query(ReportJob).filter(ReportJob.report_id == report_id).first()
+        report_job = db.query(
+            ReportJob.status,
+            ReportJob.json_data.isnot(None).label("has_json")
+        ).filter(ReportJob.report_id == report_id).first()
         
         if not report_job:
             return {"error": "Report not found", "status_code": 404}
@@ -33,54 +159,29 @@ def search_report(report_id: str, store_id: Optional[str] = None, min_uptime: Op
         if report_job.status != "Complete":
             return {"error": f"Report is {report_job.status.lower()}", "status_code": 400}
         
-        if not report_job.json_data:
+        if not report_job.has_json:
             return {"error": "No JSON data available for this report", "status_code": 400}
         
-        # Parse JSON data
-        try:
-            report_data = json.loads(report_job.json_data)
-        except json.JSONDecodeError:
-            return {"error": "Invalid JSON data in report", "status_code": 500}
-        
-        # Get stores data
-        all_stores = report_data.get("stores", [])
-        filtered_stores = []
-        
-        # Apply filters
-        for store in all_stores:
-            # Filter by store_id if provided
-            if store_id and store["store_id"] != store_id:
-                continue
-            
-            # Filter by minimum uptime if provided
-            if min_uptime is not None:
-                avg_uptime = (
-                    store["uptime_percentage"]["last_hour"] +
-                    store["uptime_percentage"]["last_day"] +
-                    store["uptime_percentage"]["last_week"]
-                ) / 3
-                if avg_uptime < min_uptime:
-                    continue
-            
-            filtered_stores.append(store)
+        restaurants = []
+        for store in db.execute(RESTAURANTS_SQL, {"report_id": report_id}):
+            restaurants.append({
+                "store_id": store.store_id,
+                "uptime_last_hour": store.last_hour,
+                "uptime_last_day": store.last_day,
+                "uptime_last_week": store.last_week,
+                "average_uptime": (
+                    store.avg_uptime if store.avg_uptime is not None
+                    else round((store.last_hour + store.last_day + store.last_week) / 3, 1)
+                )
+            })
         
-        # Prepare response
-        result = {
+        return {
             "report_id": report_id,
-            "report_metadata": report_data.get("report_metadata", {}),
-            "filters_applied": {
-                "store_id": store_id,
-                "min_uptime": min_uptime
-            },
-            "results": {
-                "total_stores_found": len(filtered_stores),
-                "stores": filtered_stores
-            },
+            "total_restaurants": len(restaurants),
+            "restaurants": restaurants,
             "status_code": 200
         }
         
-        return result
-        
     finally:
         db.close()
 
@@ -96,17 +197,14 @@ def get_store_details(report_id: str, store_id: str) -> Dict[str, Any]:
     Returns:
         Detailed store information
     """
-    search_result = search_report(report_id, store_id=store_id)
+    loaded = _get_report_data(report_id)
+    if loaded["status_code"] != 200:
+        return loaded
     
-    if search_result.get("status_code") != 200:
-        return search_result
-    
-    stores = search_result["results"]["stores"]
-    if not stores:
+    store_data = loaded["stores_by_id"].get(store_id)
+    if store_data is None:
         return {"error": f"Store {store_id} not found in report", "status_code": 404}
     
-    store_data = stores[0]  # Should be only one since we filtered by store_id
-    
     # Add enhanced details for frontend
     enhanced_data = {
         "report_id": report_id,
@@ -132,11 +230,7 @@ def get_store_details(report_id: str, store_id: str) -> Dict[str, Any]:
             }
         },
         "summary": {
-            "average_uptime_percentage": round(
-                (store_data["uptime_percentage"]["last_hour"] +
-                 store_data["uptime_percentage"]["last_day"] +
-                 store_data["uptime_percentage"]["last_week"]) / 3, 1
-            ),
+            "average_uptime_percentage": _get_average_uptime(store_data),
             "performance_status": _get_performance_status(store_data),
             "total_business_hours_week": store_data["total_business_time"]["last_week_hours"]
         },
@@ -147,94 +241,86 @@ def get_store_details(report_id: str, store_id: str) -> Dict[str, Any]:
     return enhanced_data
 
 
-def _get_performance_status(store_data: Dict[str, Any]) -> str:
+def classify_performance(avg_uptime: float) -> str:
     """
-    Get performance status based on uptime percentages
+    Get performance status for an average uptime percentage
+    """
+    return PERFORMANCE_STATUSES[bisect_right(PERFORMANCE_THRESHOLDS, avg_uptime)]
+
+
+def _get_average_uptime(store_data: Dict[str, Any]) -> float:
+    """
+    Get the average uptime percentage, rounded to one decimal
+    (precomputed in reports generated since it was added)
+    """
+    avg_uptime = store_data.get("avg_uptime_percentage")
+    if avg_uptime is None:
+        avg_uptime = round(_average_of_percentages(store_data), 1)
+    return avg_uptime
+
+
+def _average_of_percentages(store_data: Dict[str, Any]) -> float:
+    """
+    Average of the three uptime percentages
     """
-    avg_uptime = (
+    return (
         store_data["uptime_percentage"]["last_hour"] +
         store_data["uptime_percentage"]["last_day"] +
         store_data["uptime_percentage"]["last_week"]
     ) / 3
-    
-    if avg_uptime >= 95:
-        return "Excellent"
-    elif avg_uptime >= 90:
-        return "Good"
-    elif avg_uptime >= 80:
-        return "Fair"
-    elif avg_uptime >= 70:
-        return "Poor"
-    else:
-        return "Critical"
+
+
+def _get_performance_status(store_data: Dict[str, Any]) -> str:
+    """
+    Get performance status based on uptime percentages
+    """
+    return store_data.get("performance_status") or classify_performance(_average_of_percentages(store_data))
 
 
 def get_report_summary(report_id: str) -> Dict[str, Any]:
     """
     Get summary statistics for the entire report
     """
-    db = SessionLocal()
-    try:
-        report_job = db.query(ReportJob).filter(ReportJob.report_id == report_id).first()
-        
-        if not report_job or report_job.status != "Complete" or not report_job.json_data:
-            return {"error": "Report not available", "status_code": 400}
-        
-        report_data = json.loads(report_job.json_data)
-        stores = report_data.get("stores", [])
-        
-        if not stores:
-            return {"error": "No store data in report", "status_code": 400}
-        
-        # Calculate summary statistics
-        total_stores = len(stores)
-        uptime_percentages = []
-        
-        excellent_stores = 0
-        good_stores = 0
-        fair_stores = 0
-        poor_stores = 0
-        critical_stores = 0
-        
-        for store in stores:
-            avg_uptime = (
-                store["uptime_percentage"]["last_hour"] +
-                store["uptime_percentage"]["last_day"] +
-                store["uptime_percentage"]["last_week"]
-            ) / 3
-            uptime_percentages.append(avg_uptime)
-            
-            if avg_uptime >= 95:
-                excellent_stores += 1
-            elif avg_uptime >= 90:
-                good_stores += 1
-            elif avg_uptime >= 80:
-                fair_stores += 1
-            elif avg_uptime >= 70:
-                poor_stores += 1
-            else:
-                critical_stores += 1
-        
-        summary = {
-            "report_id": report_id,
-            "report_metadata": report_data.get("report_metadata", {}),
-            "summary_statistics": {
-                "total_stores": total_stores,
-                "average_uptime_percentage": round(sum(uptime_percentages) / len(uptime_percentages), 1),
-                "min_uptime_percentage": round(min(uptime_percentages), 1),
-                "max_uptime_percentage": round(max(uptime_percentages), 1),
-                "performance_distribution": {
-                    "excellent": {"count": excellent_stores, "percentage": round(excellent_stores/total_stores*100, 1)},
-                    "good": {"count": good_stores, "percentage": round(good_stores/total_stores*100, 1)},
-                    "fair": {"count": fair_stores, "percentage": round(fair_stores/total_stores*100, 1)},
-                    "poor": {"count": poor_stores, "percentage": round(poor_stores/total_stores*100, 1)},
-                    "critical": {"count": critical_stores, "percentage": round(critical_stores/total_stores*100, 1)}
-                }
-            },
-            "status_code": 200
-        }
-        
-        return summary
-        
-    finally:
-        db.close()
+    loaded = _get_report_data(report_id)
+    if loaded["status_code"] != 200:
+        return {"error": "Report not available", "status_code": 400}
+    report_data = loaded["report_data"]
+    
+    stores = report_data.get("stores", [])
+    
+    if not stores:
+        return {"error": "No store data in report", "status_code": 400}
+    
+    # Calculate summary statistics
+    total_stores = len(stores)
+    # Exact averages, rounded only for display
+    uptime_percentages = [_average_of_percentages(store) for store in stores]
+    
+    # Stores per performance bucket (precomputed in the report)
+    status_counts = Counter(_get_performance_status(store) for store in stores)
+    excellent_stores = status_counts["Excellent"]
+    good_stores = status_counts["Good"]
+    fair_stores = status_counts["Fair"]
+    poor_stores = status_counts["Poor"]
+    critical_stores = status_counts["Critical"]
+    
+    summary = {
+        "report_id": report_id,
+        "report_metadata": report_data.get("report_metadata", {}),
+        "summary_statistics": {
+            "total_stores": total_stores,
+            "average_uptime_percentage": round(sum(uptime_percentages) / total_stores, 1),
+            "min_uptime_percentage": round(min(uptime_percentages), 1),
+            "max_uptime_percentage": round(max(uptime_percentages), 1),
+            "performance_distribution": {
+                "excellent": {"count": excellent_stores, "percentage": round(excellent_stores/total_stores*100, 1)},
+                "good": {"count": good_stores, "percentage": round(good_stores/total_stores*100, 1)},
+                "fair": {"count": fair_stores, "percentage": round(fair_stores/total_stores*100, 1)},
+                "poor": {"count": poor_stores, "percentage": round(poor_stores/total_stores*100, 1)},
+                "critical": {"count": critical_stores, "percentage": round(critical_stores/total_stores*100, 1)}
+            }
+        },
+        "status_code": 200
+    }
+    
+    return summary
@@ -0,0 +1,153 @@
+"""
+SQL uptime service
+Runs the business-hours clipping and extrapolation inside PostgreSQL
+"""
+
+from datetime import datetime
+from sqlalchemy import text
+from typing import Dict, Iterator, Tuple
+
+from .store_service import DEFAULT_TIMEZONE
+
+
+# Same rules as calculation_service.extrapolate_uptime, applied per business
+# period with window functions:
+# - period start -> first observation takes the first observation's status
+# - each observation lasts until the next one (LEAD) or the period end
+# - a period without observations counts as uptime
+UPTIME_SQL = text("""
+WITH windows (name, window_start) AS (
+    VALUES ('hour', CAST(:hour_start AS timestamptz)),
+           ('day', CAST(:day_start AS timestamptz)),
+           ('week', CAST(:week_start AS timestamptz))
+),
+stores AS (
+    -- Stores with observations in the week, default timezone when missing
+    SELECT s.store_id, COALESCE(t.timezone_str, :default_tz) AS tz
+    FROM (
+        SELECT DISTINCT store_id
+        FROM store_status
+        WHERE timestamp_utc BETWEEN CAST(:week_start AS timestamptz) AND CAST(:current_time AS timestamptz)
+    ) s
+    LEFT JOIN store_timezones t ON t.store_id = s.store_id
+),
+hours AS (
+    SELECT h.store_id, h."dayOfWeek" AS dow, h.start_time_local AS start_t, h.end_time_local AS end_t
+    FROM store_hours h
+    JOIN stores s ON s.store_id = h.store_id
+    UNION ALL
+    -- Default: 24/7 operation when a store has no business hours
+    SELECT s.store_id, d.dow, TIME '00:00:00', TIME '23:59:59'
+    FROM stores s
+    CROSS JOIN generate_series(0, 6) AS d (dow)
+    WHERE NOT EXISTS (SELECT 1 FROM store_hours h WHERE h.store_id = s.store_id)
+),
+days AS (
+    SELECT s.store_id, s.tz, w.name, w.window_start, CAST(gs AS date) AS local_date
+    FROM stores s
+    CROSS JOIN windows w
+    CROSS JOIN LATERAL generate_series(
+        CAST(w.window_start AT TIME ZONE s.tz AS date),
+        CAST(CAST(:current_time AS timestamptz) AT TIME ZONE s.tz AS date),
+        INTERVAL '1 day'
+    ) AS gs
+),
+periods AS (
+    SELECT ROW_NUMBER() OVER () AS period_id, p.*
+    FROM (
+        SELECT d.store_id, d.name,
+               GREATEST((d.local_date + h.start_t) AT TIME ZONE d.tz, d.window_start) AS period_start,
+               LEAST((d.local_date + h.end_t) AT TIME ZONE d.tz, CAST(:current_time AS timestamptz)) AS period_end
+        FROM days d
+        JOIN hours h
+          ON h.store_id = d.store_id
+         AND h.dow = EXTRACT(ISODOW FROM d.local_date) - 1
+    ) p
+    WHERE p.period_start < p.period_end
+),
+observations AS (
+    SELECT p.period_id, s.timestamp_utc, s.status = 'active' AS is_active,
+           LEAD(s.timestamp_utc) OVER w AS next_ts,
+           ROW_NUMBER() OVER w AS rn
+    FROM periods p
+    JOIN store_status s
+      ON s.store_id = p.store_id
+     AND s.timestamp_utc BETWEEN p.period_start AND p.period_end
+    WINDOW w AS (PARTITION BY p.period_id ORDER BY s.timestamp_utc)
+),
+segments AS (
+    SELECT p.period_id, o.timestamp_utc - p.period_start AS duration, o.is_active
+    FROM observations o
+    JOIN periods p USING (period_id)
+    WHERE o.rn = 1
+    UNION ALL
+    SELECT p.period_id, COALESCE(o.next_ts, p.period_end) - o.timestamp_utc, o.is_active
+    FROM observations o
+    JOIN periods p USING (period_id)
+    UNION ALL
+    SELECT p.period_id, p.period_end - p.period_start, TRUE
+    FROM periods p
+    WHERE NOT EXISTS (SELECT 1 FROM observations o WHERE o.period_id = p.period_id)
+)
+SELECT CAST(p.store_id AS text) AS store_id, p.name,
+       COALESCE(SUM(EXTRACT(EPOCH FROM seg.duration)) FILTER (WHERE seg.is_active), 0) / 60 AS uptime_minutes,
+       COALESCE(SUM(EXTRACT(EPOCH FROM seg.duration)) FILTER (WHERE NOT seg.is_active), 0) / 60 AS downtime_minutes
+FROM periods p
+JOIN segments seg USING (period_id)
+GROUP BY p.store_id, p.name
+""")
+
+
+# Same store set as the stores CTE, in store_id order
+STORES_SQL = text("""
+SELECT CAST(store_id AS text)
+FROM (
+    SELECT DISTINCT store_id
+    FROM store_status
+    WHERE timestamp_utc BETWEEN CAST(:week_start AS timestamptz) AND CAST(:current_time AS timestamptz)
+) s
+ORDER BY store_id
+""")
+
+
+def calculate_all_store_uptime_sql(
+    db,
+    last_hour_start: datetime,
+    last_day_start: datetime,
+    last_week_start: datetime,
+    current_time: datetime
+) -> Iterator[Tuple[str, Dict[str, float], Dict[str, float], Dict[str, float]]]:
+    """
+    Calculate uptime/downtime for every store in one query
+    Yields (store_id, hour_data, day_data, week_data) like the Python path
+    """
+    # Both result sets are streamed (server-side cursors) like the Python path's status rows
+    rows = db.connection().execute(UPTIME_SQL.execution_options(yield_per=10_000), {
+        "hour_start": last_hour_start,
+        "day_start": last_day_start,
+        "week_start": last_week_start,
+        "current_time": current_time,
+        "default_tz": DEFAULT_TIMEZONE,
+    })
+
+    uptime_by_store: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for store_id, name, uptime_minutes, downtime_minutes in rows:
+        uptime_by_store.setdefault(store_id, {})[name] = {
+            "uptime_minutes": float(uptime_minutes),
+            "downtime_minutes": float(downtime_minutes)
+        }
+
+    # Stores without any business period in a window get zeros, like the Python path
+    empty = {"uptime_minutes": 0.0, "downtime_minutes": 0.0}
+    store_ids = db.connection().execute(STORES_SQL.execution_options(yield_per=1000), {
+        "week_start": last_week_start,
+        "current_time": current_time,
+    }).scalars()
+    for store_id in store_ids:
+        periods = uptime_by_store.get(store_id, {})
+        yield (
+            store_id,
+            periods.get("hour", empty),
+            periods.get("day", empty),
+            periods.get("week", empty)
+        )
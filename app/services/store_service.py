@@ -3,37 +3,104 @@ Store data service
 Handles store-related data retrieval
 """
 
-import pytz
-from typing import List, Any
+from collections import defaultdict, namedtuple
+from datetime import datetime, time
+from functools import lru_cache
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from uuid import UUID
+from zoneinfo import ZoneInfo
 
-from ..models import StoreTimezone, StoreHours
+from sqlalchemy import String, cast, func, select
 
+from ..models import StoreTimezone, StoreHours, StoreStatus, IngestState
 
-def get_store_timezone(db, store_id: str) -> pytz.BaseTzInfo:
+
+# Same fields as the store_hours rows loaded by get_all_store_business_hours
+DefaultHours = namedtuple("DefaultHours", "dayOfWeek start_time_local end_time_local")
+
+# Default: 24/7 operation as per requirements (0=Monday to 6=Sunday).
+# Built once and shared, callers must not modify it
+_DEFAULT_HOURS = [DefaultHours(day, time(0, 0, 0), time(23, 59, 59)) for day in range(7)]
+
+# Business hours of the last report, keyed by a (row count, max id) snapshot
+# of store_hours so reports after an ingest reload them
+_business_hours_cache: Dict[Tuple[int, Optional[int]], Dict[str, List[Any]]] = {}
+
+
+@lru_cache(maxsize=512)
+def _tz(name: str) -> ZoneInfo:
     """
-    Get store timezone, default to America/Chicago if missing
+    ZoneInfo by name, so each zone is resolved once per process
+    """
+    return ZoneInfo(name)
+
+
+# Default as per requirements
+DEFAULT_TIMEZONE = "America/Chicago"
+_DEFAULT_TZ = _tz(DEFAULT_TIMEZONE)
+
+
+def get_latest_status_timestamp(db) -> Optional[datetime]:
     """
-    timezone_record = db.query(StoreTimezone).filter(StoreTimezone.store_id == store_id).first()
-    if timezone_record:
-        return pytz.timezone(timezone_record.timezone_str)
-    else:
-        return pytz.timezone("America/Chicago")  # Default as per requirements
+    Get the newest status timestamp recorded by ingestion
+    Falls back to scanning store_status if nothing was recorded
+    """
+    latest = db.execute(select(IngestState.max_timestamp_utc).where(IngestState.id == 1)).scalar()
+    if latest is None:
+        latest = db.execute(select(func.max(StoreStatus.timestamp_utc))).scalar()
+    return latest
 
 
-def get_store_business_hours(db, store_id: str) -> List[Any]:
+def iter_store_timezones(db, start_id: Optional[UUID] = None, end_id: Optional[UUID] = None) -> Iterator[Tuple[str, str]]:
     """
-    Get store business hours, default to 24/7 if missing
+    Stream (store_id, timezone name) for every store, ordered by store_id
+    Optionally only stores in [start_id, end_id)
     """
-    business_hours = db.query(StoreHours).filter(StoreHours.store_id == store_id).all()
+    query = select(cast(StoreTimezone.store_id, String), StoreTimezone.timezone_str)
+    if start_id is not None:
+        query = query.where(StoreTimezone.store_id >= start_id)
+    if end_id is not None:
+        query = query.where(StoreTimezone.store_id < end_id)
     
-    if not business_hours:
-        # Default: 24/7 operation as per requirements
-        business_hours = []
-        for day in range(7):  # 0=Monday to 6=Sunday
-            business_hours.append(type('obj', (object,), {
-                'dayOfWeek': day,
-                'start_time_local': '00:00:00',
-                'end_time_local': '23:59:59'
-            }))
+    # store_id as text: the canonical UUID text sorts like the UUID itself
+    yield from db.connection().execute(
+        query.order_by(StoreTimezone.store_id).execution_options(yield_per=1000)
+    )
+
+
+def get_all_store_business_hours(db) -> Dict[str, List[Any]]:
+    """
+    Get business hours for every store grouped by store_id
+    Reused across reports until store_hours changes
+    """
+    snapshot = tuple(db.execute(select(func.count(), func.max(StoreHours.id))).one())
     
+    business_hours = _business_hours_cache.get(snapshot)
+    if business_hours is None:
+        # Plain rows (not ORM objects) so they outlive the session
+        business_hours = defaultdict(list)
+        for record in db.execute(select(
+            StoreHours.store_id,
+            StoreHours.dayOfWeek,
+            StoreHours.start_time_local,
+            StoreHours.end_time_local
+        )):
+            business_hours[str(record.store_id)].append(record)
+        
+        _business_hours_cache.clear()
+        business_hours = _business_hours_cache[snapshot] = dict(business_hours)
     return business_hours
+
+
+def get_store_timezone(timezone_str: Optional[str]) -> ZoneInfo:
+    """
+    Get store timezone, default to America/Chicago if missing
+    """
+    return _tz(timezone_str) if timezone_str else _DEFAULT_TZ
+
+
+def get_store_business_hours(business_hours: Dict[str, List[Any]], store_id: str) -> List[Any]:
+    """
+    Get store business hours, default to 24/7 if missing
+    """
+    return business_hours.get(store_id) or _DEFAULT_HOURS
@@ -3,53 +3,73 @@ Time and business hours calculation service
 Handles timezone conversions and business period calculations
 """
 
-from datetime import datetime, timedelta, time
-import pytz
-from typing import List, Tuple, Any
+from datetime import date, datetime, timedelta, time, tzinfo
+from typing import Dict, List, Tuple, Any
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 def get_business_periods_in_range(
     business_hours: List[Any], 
     start_time: datetime, 
     end_time: datetime, 
-    store_tz: pytz.BaseTzInfo
-) -> List[Tuple[datetime, datetime]]:
+    store_tz: tzinfo
+) -> List[Tuple[float, float]]:
     """
     Get all business periods that overlap with the given time range
-    Returns list of (period_start, period_end) tuples in store timezone
+    Returns list of (period_start, period_end) tuples as UTC epoch seconds
     """
-    # Convert UTC times to store local time
-    start_local = start_time.replace(tzinfo=pytz.UTC).astimezone(store_tz)
-    end_local = end_time.replace(tzinfo=pytz.UTC).astimezone(store_tz)
+    start_ts = start_time.timestamp()
+    end_ts = end_time.timestamp()
     
     business_periods = []
     
-    # Process each day in the range
-    current_date = start_local.date()
-    end_date = end_local.date()
+    # Group the hours by weekday and convert them to seconds since local midnight
+    # once, rather than filtering and converting them again for every day
+    hours_by_day: Dict[int, List[Tuple[int, int, time, time]]] = {}
+    for hours in business_hours:
+        start_local = hours.start_time_local
+        end_local = hours.end_time_local
+        hours_by_day.setdefault(hours.dayOfWeek, []).append((
+            start_local.hour * 3600 + start_local.minute * 60 + start_local.second,
+            end_local.hour * 3600 + end_local.minute * 60 + end_local.second,
+            start_local,
+            end_local
+        ))
+    
+    # Process each local day in the range
+    current_date = start_time.astimezone(store_tz).date()
+    end_date = end_time.astimezone(store_tz).date()
     
     while current_date <= end_date:
         # Find business hours for this day (0=Monday, 6=Sunday)
         day_of_week = current_date.weekday()  # 0=Monday, 6=Sunday (matches CSV format)
         
-        day_business_hours = [h for h in business_hours if h.dayOfWeek == day_of_week]
+        day_business_hours = hours_by_day.get(day_of_week, ())
         
-        for hours in day_business_hours:
-            # Parse time strings
-            start_hour, start_minute, start_second = map(int, hours.start_time_local.split(':'))
-            end_hour, end_minute, end_second = map(int, hours.end_time_local.split(':'))
-            
+        if day_business_hours:
+            # Look the UTC offset up once per day instead of localizing every boundary;
+            # only DST transition days need per-boundary offsets
+            day_start = datetime.combine(current_date, time())
+            offset = store_tz.utcoffset(day_start)
+            if offset == store_tz.utcoffset(datetime.combine(current_date, time.max)):
+                midnight_ts = (current_date.toordinal() - _EPOCH_ORDINAL) * 86400 - offset.total_seconds()
+            else:
+                midnight_ts = None
+        
+        for start_seconds, end_seconds, start_local, end_local in day_business_hours:
             # Create business period for this day
-            business_start = store_tz.localize(
-                datetime.combine(current_date, time(start_hour, start_minute, start_second))
-            )
-            business_end = store_tz.localize(
-                datetime.combine(current_date, time(end_hour, end_minute, end_second))
-            )
+            if midnight_ts is not None:
+                business_start = midnight_ts + start_seconds
+                business_end = midnight_ts + end_seconds
+            else:
+                business_start = _local_timestamp(current_date, start_local, store_tz)
+                business_end = _local_timestamp(current_date, end_local, store_tz)
             
             # Clip to our analysis period
-            period_start = max(business_start, start_local)
-            period_end = min(business_end, end_local)
+            period_start = max(business_start, start_ts)
+            period_end = min(business_end, end_ts)
             
             if period_start < period_end:
                 business_periods.append((period_start, period_end))
@@ -57,3 +77,32 @@ def get_business_periods_in_range(
         current_date += timedelta(days=1)
     
     return business_periods
+
+
+def _local_timestamp(local_date: date, local_time: time, store_tz: tzinfo) -> float:
+    """
+    UTC epoch seconds of a local wall-clock time
+    A time repeated by a DST fall-back resolves to its second (standard time)
+    instant, like pytz's localize(); a skipped time keeps fold=0, as pytz did
+    """
+    local_dt = datetime.combine(local_date, local_time, tzinfo=store_tz)
+    later_dt = local_dt.replace(fold=1)
+    if later_dt.utcoffset() < local_dt.utcoffset():
+        local_dt = later_dt
+    return local_dt.timestamp()
+
+
+def clip_business_periods(
+    business_periods: List[Tuple[float, float]],
+    start_time: datetime
+) -> List[Tuple[float, float]]:
+    """
+    Clip business periods to start at start_time
+    Same result as get_business_periods_in_range for a later start and the same end
+    """
+    start_ts = start_time.timestamp()
+    return [
+        (max(period_start, start_ts), period_end)
+        for period_start, period_end in business_periods
+        if period_end > start_ts
+    ]
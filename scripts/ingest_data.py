@@ -1,5 +1,8 @@
 # Filename: scripts/ingest_data.py
-import pandas as pd
+import csv
+from psycopg2 import sql
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 import sys
 import os
@@ -16,7 +19,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # --- Database and Model Imports ---
 # We import our database session factory and table models from the app.models module.
 try:
-    from app.models import SessionLocal, StoreStatus, StoreHours, StoreTimezone, engine, Base
+    from app.models import BackgroundSessionLocal, StoreStatus, StoreHours, StoreTimezone, IngestState, engine, Base
 except ImportError:
     logging.error("Could not import from app.models. Make sure the file exists and there are no circular imports.")
     sys.exit(1)
@@ -30,55 +33,79 @@ HOURS_CSV_PATH = os.path.join(BASE_DIR, 'data', 'input', 'menu_hours.csv')
 TIMEZONE_CSV_PATH = os.path.join(BASE_DIR, 'data', 'input', 'timezones.csv')
 
 
+def copy_csv(cursor, table_name: str, csv_path: str) -> int:
+    """
+    Streams a CSV file into a table with COPY FROM STDIN.
+    The header row names the target columns. Returns the number of rows copied.
+    """
+    with open(csv_path, newline='') as csv_file:
+        columns = next(csv.reader([csv_file.readline()]))
+        query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(table_name),
+            sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        cursor.copy_expert(query.as_string(cursor), csv_file)
+    return cursor.rowcount
+
+
 def ingest_data():
     """
-    Connects to the database, reads data from CSV files, and performs a bulk insert
-    into the corresponding tables.
+    Connects to the database and streams the CSV files into the corresponding
+    tables with COPY.
     """
     # Create all tables defined in models.py if they don't already exist.
     # This is safe to run multiple times.
     logging.info("Initializing database tables...")
     Base.metadata.create_all(bind=engine)
 
-    # Obtain a new database session.
-    db: Session = SessionLocal()
+    # Obtain a new database session (without the API's statement timeout, the COPY
+    # of the status CSV can take minutes).
+    db: Session = BackgroundSessionLocal()
     logging.info("Database session started.")
 
     try:
+        # COPY runs on the session's own connection, so everything below is still
+        # one transaction.
+        cursor = db.connection().connection.cursor()
+
         # --- 1. Ingest Store Timezones ---
-        logging.info(f"Reading timezones from {TIMEZONE_CSV_PATH}...")
-        tz_df = pd.read_csv(TIMEZONE_CSV_PATH)
-        # Ensure the column name matches the model's attribute.
-        tz_df.rename(columns={'timezone_str': 'timezone_str'}, inplace=True, errors='ignore')
-        # Convert the DataFrame to a list of dictionaries for bulk insertion.
-        tz_records = tz_df.to_dict(orient="records")
-        if tz_records:
-            db.bulk_insert_mappings(StoreTimezone, tz_records)
-            logging.info(f"Successfully inserted {len(tz_records)} timezone records.")
+        logging.info(f"Copying timezones from {TIMEZONE_CSV_PATH}...")
+        tz_count = copy_csv(cursor, StoreTimezone.__tablename__, TIMEZONE_CSV_PATH)
+        logging.info(f"Successfully inserted {tz_count} timezone records.")
 
         # --- 2. Ingest Store Business Hours ---
-        logging.info(f"Reading business hours from {HOURS_CSV_PATH}...")
-        hours_df = pd.read_csv(HOURS_CSV_PATH)
-        hours_records = hours_df.to_dict(orient="records")
-        if hours_records:
-            db.bulk_insert_mappings(StoreHours, hours_records)
-            logging.info(f"Successfully inserted {len(hours_records)} business hour records.")
+        logging.info(f"Copying business hours from {HOURS_CSV_PATH}...")
+        hours_count = copy_csv(cursor, StoreHours.__tablename__, HOURS_CSV_PATH)
+        logging.info(f"Successfully inserted {hours_count} business hour records.")
 
         # --- 3. Ingest Store Status ---
-        logging.info(f"Reading store status data from {STATUS_CSV_PATH}...")
-        status_df = pd.read_csv(STATUS_CSV_PATH)
-        # It's crucial to ensure the timestamp column is in the correct format.
-        # Pandas' to_datetime can often handle this automatically.
-        status_df['timestamp_utc'] = pd.to_datetime(status_df['timestamp_utc'])
-        status_records = status_df.to_dict(orient="records")
-        if status_records:
-            db.bulk_insert_mappings(StoreStatus, status_records)
-            logging.info(f"Successfully inserted {len(status_records)} store status records.")
+        logging.info(f"Copying store status data from {STATUS_CSV_PATH}...")
+        # PostgreSQL parses the timestamps itself (e.g. '2024-03-03 14:30:00.000000 UTC').
+        status_count = copy_csv(cursor, StoreStatus.__tablename__, STATUS_CSV_PATH)
+        logging.info(f"Successfully inserted {status_count} store status records.")
+
+        if status_count:
+            # Keep the newest timestamp in ingest_state so reports don't have to scan for it
+            upsert = insert(IngestState).values(
+                id=1,
+                max_timestamp_utc=select(func.max(StoreStatus.timestamp_utc)).scalar_subquery()
+            )
+            db.execute(upsert.on_conflict_do_update(
+                index_elements=[IngestState.id],
+                set_={"max_timestamp_utc": upsert.excluded.max_timestamp_utc}
+            ))
 
         # If all insertions are successful, commit the transaction to the database.
         db.commit()
         logging.info("All data has been successfully committed to the database.")
 
+        # Refresh planner statistics right away (autovacuum may take a while to
+        # notice a bulk load), so the composite indexes get used for report queries.
+        for table in (StoreTimezone, StoreHours, StoreStatus):
+            db.execute(text(f"ANALYZE {table.__tablename__}"))
+        db.commit()
+        logging.info("Table statistics updated.")
+
     except FileNotFoundError as e:
         logging.error(f"Error: The file was not found - {e}. Please check the file paths.")
         db.rollback() # Rollback any partial changes.